@@ -1,8 +1,45 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Now
+from django.utils.functional import cached_property
 from .models import User, OTPCode
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses PostgreSQL's row estimate instead of COUNT(*)
+    when the queryset is unfiltered and the table is large
+    """
+    # Below this many rows an exact count is cheap enough
+    estimate_threshold = 10000
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
+
+
+class ModelAdminEstimateCountMixin:
+    """
+    Avoid full-table COUNT(*) queries on changelist pages
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ('phone_number', 'national_id', 'is_phone_verified', 'is_active', 'is_staff', 'created_at')
@@ -29,15 +66,23 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(OTPCode)
-class OTPCodeAdmin(admin.ModelAdmin):
+class OTPCodeAdmin(ModelAdminEstimateCountMixin, admin.ModelAdmin):
     list_display = ('phone_number', 'purpose', 'is_used', 'created_at', 'expires_at', 'is_expired')
     list_filter = ('purpose', 'is_used', 'created_at')
     search_fields = ('phone_number',)
     readonly_fields = ('code_hash', 'created_at', 'expires_at')
     ordering = ('-created_at',)
+    list_per_page = 50
+    
+    def get_queryset(self, request):
+        # Compute expiry in SQL once per page instead of per row in Python
+        return super().get_queryset(request).annotate(
+            _is_expired=ExpressionWrapper(Q(expires_at__lt=Now()), output_field=BooleanField())
+        )
     
     def is_expired(self, obj):
-        return obj.is_expired()
+        return obj._is_expired
     is_expired.boolean = True
     is_expired.short_description = 'Expired'
+    is_expired.admin_order_field = '_is_expired'
 
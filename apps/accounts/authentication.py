@@ -1,6 +1,74 @@
+import hashlib
+import threading
+import time
+
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from django.conf import settings
+from django.core.cache import cache
+
+
+_COOKIE_NAME = settings.COOKIE_ACCESS_TOKEN_NAME
+
+# Validated tokens keyed by a digest of the raw token, so raw tokens are not
+# kept in memory. Entries expire at the token's own `exp` claim.
+_TOKEN_CACHE_MAX_TTL = 3600
+_TOKEN_CACHE_MAX_SIZE = 10000
+_token_cache = {}
+_token_cache_lock = threading.Lock()
+
+# Authenticated users are cached by id for a short time to skip the users
+# lookup on every request
+USER_CACHE_TIMEOUT = 60
+
+
+def _user_cache_key(user_id):
+    return f'jwt_user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    """
+    Drop cached user so the next request reloads it from database
+    """
+    cache.delete(_user_cache_key(user_id))
+
+
+def _token_cache_key(raw_token):
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    return hashlib.blake2b(raw_token, digest_size=32).digest()
+
+
+def _get_cached_token(key):
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, validated_token = entry
+        if expires_at <= time.time():
+            del _token_cache[key]
+            return None
+        return validated_token
+
+
+def _cache_token(key, validated_token):
+    now = time.time()
+    exp = validated_token.get('exp')
+    if exp is None:
+        return
+    ttl = min(exp - now, _TOKEN_CACHE_MAX_TTL)
+    if ttl <= 0:
+        return
+    with _token_cache_lock:
+        if len(_token_cache) >= _TOKEN_CACHE_MAX_SIZE:
+            # Drop expired entries first; if still full, start over
+            for cached_key in [k for k, (expires_at, _) in _token_cache.items() if expires_at <= now]:
+                del _token_cache[cached_key]
+            if len(_token_cache) >= _TOKEN_CACHE_MAX_SIZE:
+                _token_cache.clear()
+        _token_cache[key] = (now + ttl, validated_token)
 
 
 class CookieJWTAuthentication(JWTAuthentication):
@@ -10,7 +78,7 @@ class CookieJWTAuthentication(JWTAuthentication):
     
     def authenticate(self, request):
         # Try to get token from cookie first
-        raw_token = request.COOKIES.get(settings.COOKIE_ACCESS_TOKEN_NAME)
+        raw_token = request.COOKIES.get(_COOKIE_NAME)
         
         if raw_token is None:
             # Fallback to header for backward compatibility
@@ -22,12 +90,37 @@ class CookieJWTAuthentication(JWTAuthentication):
             if raw_token is None:
                 return None
         
-        if raw_token is None:
-            return None
-        
         try:
-            validated_token = self.get_validated_token(raw_token)
+            validated_token = self.get_cached_validated_token(raw_token)
             return self.get_user(validated_token), validated_token
         except (InvalidToken, TokenError):
             return None
-
+    
+    def get_cached_validated_token(self, raw_token):
+        """
+        Validate token, reusing earlier successful validations until the token expires
+        """
+        key = _token_cache_key(raw_token)
+        validated_token = _get_cached_token(key)
+        if validated_token is None:
+            validated_token = self.get_validated_token(raw_token)
+            # Only successfully validated tokens reach this point
+            _cache_token(key, validated_token)
+        return validated_token
+    
+    def get_user(self, validated_token):
+        """
+        Get user for token, served from cache when possible
+        """
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        
+        cache_key = _user_cache_key(user_id)
+        user = cache.get(cache_key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(cache_key, user, USER_CACHE_TIMEOUT)
+        elif not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils import timezone
 
@@ -47,7 +49,6 @@ class User(AbstractUser):
     phone_number = models.CharField(
         max_length=15,
         unique=True,
-        db_index=True,
         help_text="User's phone number"
     )
     is_phone_verified = models.BooleanField(
@@ -59,7 +60,6 @@ class User(AbstractUser):
         null=True,
         blank=True,
         unique=True,
-        db_index=True,
         help_text="کد ملی کاربر"
     )
     created_at = models.DateTimeField(auto_now_add=True)
@@ -75,9 +75,7 @@ class User(AbstractUser):
         verbose_name = 'User'
         verbose_name_plural = 'Users'
         indexes = [
-            models.Index(fields=['phone_number']),
             models.Index(fields=['created_at']),
-            models.Index(fields=['national_id']),
         ]
     
     def __str__(self):
@@ -93,8 +91,8 @@ class OTPCode(models.Model):
         ('login', 'Login'),
     ]
     
-    phone_number = models.CharField(max_length=15, db_index=True)
-    code_hash = models.CharField(max_length=255)  # Hashed OTP code
+    phone_number = models.CharField(max_length=15)
+    code_hash = models.CharField(max_length=64)  # HMAC-SHA256 hex of OTP code
     purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
@@ -106,7 +104,13 @@ class OTPCode(models.Model):
         verbose_name_plural = 'OTP Codes'
         indexes = [
             models.Index(fields=['phone_number', 'created_at']),
-            models.Index(fields=['phone_number', 'purpose', 'is_used']),
+            # Lookup of the latest active OTP in verify_otp, no sort step needed
+            models.Index(
+                fields=['phone_number', 'purpose', '-created_at'],
+                condition=models.Q(is_used=False),
+                name='otp_active_lookup_idx',
+            ),
+            models.Index(fields=['expires_at']),
         ]
         ordering = ['-created_at']
     
@@ -121,3 +125,14 @@ class OTPCode(models.Model):
         """Check if OTP code is valid (not used and not expired)"""
         return not self.is_used and not self.is_expired()
 
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user_on_change(sender, instance, **kwargs):
+    """Drop the cached auth user whenever the row changes (admin, shell, ...)"""
+    from .authentication import invalidate_cached_user
+    
+    # After commit, so a concurrent request can't re-cache the old row; pk
+    # is read now since delete() clears it before commit
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
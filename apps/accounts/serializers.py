@@ -1,3 +1,5 @@
+import re
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -5,6 +7,9 @@ from .models import OTPCode
 
 User = get_user_model()
 
+_NON_DIGIT_RE = re.compile(r'\D+')
+_DIGIT_RE = re.compile(r'^[0-9]+\Z')
+
 
 class PhoneNumberSerializer(serializers.Serializer):
     """
@@ -24,7 +29,7 @@ class PhoneNumberSerializer(serializers.Serializer):
         Validate phone number format (basic validation)
         """
         # Remove any non-digit characters
-        cleaned = ''.join(filter(str.isdigit, value))
+        cleaned = _NON_DIGIT_RE.sub('', value)
         
         if len(cleaned) < 10:
             raise serializers.ValidationError("Phone number must be at least 10 digits")
@@ -50,7 +55,7 @@ class OTPVerificationSerializer(serializers.Serializer):
         """
         Validate phone number format
         """
-        cleaned = ''.join(filter(str.isdigit, value))
+        cleaned = _NON_DIGIT_RE.sub('', value)
         
         if len(cleaned) < 10:
             raise serializers.ValidationError("Phone number must be at least 10 digits")
@@ -61,7 +66,7 @@ class OTPVerificationSerializer(serializers.Serializer):
         """
         Validate OTP code format
         """
-        if not value.isdigit():
+        if not _DIGIT_RE.match(value):
             raise serializers.ValidationError("OTP code must contain only digits")
         
         return value
@@ -1,13 +1,32 @@
-import random
-import string
+import secrets
 import hashlib
+import hmac
+import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.db import connection
+from django.db.models import Subquery
 from django.utils import timezone
 from django.conf import settings
-from django.contrib.auth.hashers import make_password, check_password
 from .models import OTPCode, User
 
+logger = logging.getLogger(__name__)
+
+
+# Shared HTTP session so connections to KavehNegar are kept alive and reused
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=2, backoff_factor=0.1),
+))
+
+# Background workers for SMS sends, so request threads don't wait on the provider
+_sms_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='kavehnegar-sms')
+
 
 class OTPService:
     """
@@ -17,12 +36,12 @@ class OTPService:
     @staticmethod
     def generate_otp_code(length=None):
         """
-        Generate a random OTP code
+        Generate a cryptographically secure random OTP code
         """
         if length is None:
             length = settings.OTP_CODE_LENGTH
         
-        return ''.join(random.choices(string.digits, k=length))
+        return f"{secrets.randbelow(10 ** length):0{length}d}"
     
     @staticmethod
     def create_otp(phone_number, purpose):
@@ -30,7 +49,7 @@ class OTPService:
         Create and save an OTP code for the given phone number
         Returns the plain OTP code (to be sent via SMS) and the OTPCode instance
         """
-        # Check rate limiting
+        # Check rate limiting (the request throttle is only a first gate)
         if not OTPService._check_rate_limit(phone_number):
             raise ValueError("Too many OTP requests. Please try again later.")
         
@@ -38,7 +57,7 @@ class OTPService:
         otp_code = OTPService.generate_otp_code()
         
         # Hash the code
-        code_hash = make_password(otp_code)
+        code_hash = OTPService._hash_code(otp_code)
         
         # Calculate expiry time
         expires_at = timezone.now() + timedelta(minutes=settings.OTP_EXPIRY_MINUTES)
@@ -56,58 +75,74 @@ class OTPService:
     @staticmethod
     def verify_otp(phone_number, code, purpose):
         """
-        Verify an OTP code
-        Returns the OTPCode instance if valid, None otherwise
+        Verify an OTP code and mark it as used
+        Returns True if valid, False otherwise
         """
-        # Get the most recent unused OTP for this phone number and purpose
-        otp_instance = OTPCode.objects.filter(
+        code_hash = OTPService._hash_code(code)
+        
+        # The most recent unused, unexpired OTP for this phone number and purpose
+        latest_otp = OTPCode.objects.filter(
             phone_number=phone_number,
             purpose=purpose,
+            is_used=False,
+            expires_at__gt=timezone.now()
+        ).order_by('-created_at').values('pk')[:1]
+        
+        # Check and consume in one UPDATE; a wrong code matches no row and
+        # of two concurrent verifies only one can flip is_used
+        updated = OTPCode.objects.filter(
+            pk=Subquery(latest_otp),
+            code_hash=code_hash,
             is_used=False
-        ).order_by('-created_at').first()
+        ).update(is_used=True)
         
-        if not otp_instance:
-            return None
-        
-        # Check if expired
-        if otp_instance.is_expired():
-            return None
-        
-        # Verify the code
-        if check_password(code, otp_instance.code_hash):
-            # Mark as used
-            otp_instance.is_used = True
-            otp_instance.save()
-            return otp_instance
-        
-        return None
+        return updated == 1
+    
+    @staticmethod
+    def _hash_code(code):
+        """
+        Hex HMAC-SHA256 of an OTP code with the server-side pepper
+        """
+        return hmac.new(
+            settings.OTP_PEPPER.encode(), code.encode(), hashlib.sha256
+        ).hexdigest()
     
     @staticmethod
     def _check_rate_limit(phone_number):
         """
         Check if the phone number has exceeded the rate limit
         Returns True if allowed, False if rate limited
+        Counted in database, so the limit holds across workers and restarts
+        whatever cache backend is configured
         """
-        limit_minutes = settings.OTP_RATE_LIMIT_MINUTES
-        limit_count = settings.OTP_RATE_LIMIT_COUNT
-        
-        since = timezone.now() - timedelta(minutes=limit_minutes)
-        
+        since = timezone.now() - timedelta(minutes=settings.OTP_RATE_LIMIT_MINUTES)
         recent_otps = OTPCode.objects.filter(
             phone_number=phone_number,
             created_at__gte=since
         ).count()
-        
-        return recent_otps < limit_count
+        return recent_otps < settings.OTP_RATE_LIMIT_COUNT
     
     @staticmethod
-    def cleanup_expired_otps():
+    def cleanup_expired_otps(batch_size=5000):
         """
-        Clean up expired OTP codes (can be run as a periodic task)
+        Clean up expired OTP codes (run periodically by the scheduler)
+        Deletes in batches to keep each DELETE's lock time short
         """
-        expired_count = OTPCode.objects.filter(
-            expires_at__lt=timezone.now()
-        ).delete()[0]
+        table = OTPCode._meta.db_table
+        expires_before = connection.ops.adapt_datetimefield_value(timezone.now())
+        expired_count = 0
+        
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE id IN "
+                    f"(SELECT id FROM {table} WHERE expires_at < %s LIMIT %s)",
+                    [expires_before, batch_size]
+                )
+                deleted = cursor.rowcount
+            expired_count += deleted
+            if deleted < batch_size:
+                break
         
         return expired_count
 
@@ -141,7 +176,7 @@ class KavehNegarService:
         }
         
         try:
-            response = requests.post(url, data=data, timeout=10)
+            response = _session.post(url, data=data, timeout=10)
             
             # Check HTTP status
             if response.status_code != 200:
@@ -185,4 +220,17 @@ class KavehNegarService:
         Convenience method to send OTP
         """
         return KavehNegarService.send_otp_sms(phone_number, otp_code)
-
+    
+    @staticmethod
+    def send_otp_in_background(phone_number, otp_code):
+        """
+        Queue OTP SMS without blocking the caller; failures are logged
+        """
+        def log_failure(future):
+            error = future.exception()
+            if error is not None:
+                logger.error("Failed to send OTP SMS to %s: %s", phone_number, error)
+        
+        future = _sms_executor.submit(KavehNegarService.send_otp, phone_number, otp_code)
+        future.add_done_callback(log_failure)
+        return future
@@ -0,0 +1,138 @@
+"""
+Tests for accounts app views and services
+"""
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.conf import settings
+from django.core.cache import cache
+from unittest.mock import patch
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User
+from .services import KavehNegarService
+from .throttles import PhoneNumberRateThrottle
+
+
+class PhoneNumberRateThrottleParseRateTestCase(SimpleTestCase):
+    """Test cases for PhoneNumberRateThrottle.parse_rate"""
+    
+    def test_parse_rate(self):
+        """Test single and multi-unit periods"""
+        cases = [
+            ('3/10m', (3, 600)),
+            ('5/m', (5, 60)),
+            ('5/min', (5, 60)),
+            ('10/2h', (10, 7200)),
+            ('1/s', (1, 1)),
+            ('100/d', (100, 86400)),
+            (None, (None, None)),
+        ]
+        throttle = PhoneNumberRateThrottle.__new__(PhoneNumberRateThrottle)
+        for rate, expected in cases:
+            with self.subTest(rate=rate):
+                self.assertEqual(throttle.parse_rate(rate), expected)
+
+
+class RequestOTPRateLimitTestCase(APITestCase):
+    """Test cases for OTP request rate limiting"""
+    
+    url = '/api/accounts/request-otp/'
+    data = {'phone_number': '09021794990', 'purpose': 'register'}
+    
+    def setUp(self):
+        # Throttle counters live in the cache
+        cache.clear()
+        patcher = patch.object(KavehNegarService, 'send_otp_in_background')
+        self.mock_send = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_throttled_after_limit(self):
+        """Test requests over the limit get 429 without sending SMS"""
+        for _ in range(settings.OTP_RATE_LIMIT_COUNT):
+            response = self.client.post(self.url, self.data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        response = self.client.post(self.url, self.data)
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.mock_send.call_count, settings.OTP_RATE_LIMIT_COUNT)
+    
+    def test_throttle_keyed_on_normalized_phone_number(self):
+        """Test formatting variants of a phone number share one limit"""
+        for phone_number in ['09021794990', '0902-179-4990', '0902 179 4990']:
+            response = self.client.post(self.url, {'phone_number': phone_number, 'purpose': 'register'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        response = self.client.post(self.url, self.data)
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+    
+    def test_database_limit_holds_without_cache_counters(self):
+        """Test the send limit holds when throttle counters are lost"""
+        for _ in range(settings.OTP_RATE_LIMIT_COUNT):
+            response = self.client.post(self.url, self.data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        # E.g. another worker's cache, or a restarted worker
+        cache.clear()
+        response = self.client.post(self.url, self.data)
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.mock_send.call_count, settings.OTP_RATE_LIMIT_COUNT)
+
+
+class VerifyOTPRateLimitTestCase(APITestCase):
+    """Test cases for OTP verification rate limiting"""
+    
+    url = '/api/accounts/verify-otp/'
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_throttled_after_limit(self):
+        """Test verify attempts over the limit get 429"""
+        data = {'phone_number': '09021794990', 'code': '000000', 'purpose': 'login'}
+        for _ in range(settings.OTP_VERIFY_RATE_LIMIT_COUNT):
+            response = self.client.post(self.url, data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.post(self.url, data)
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class CachedUserTestCase(APITestCase):
+    """Test cases for the authentication user cache"""
+    
+    url = '/api/accounts/profile/'
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone_number='09021794990')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+    
+    def test_deactivated_user_rejected(self):
+        """Test saving a deactivated user drops it from the cache"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_patch_does_not_write_back_cached_user(self):
+        """Test a profile update never restores fields from the cached user"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        # Bypasses signals, so the cached user stays active
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.client.patch(self.url, {'national_id': '0012345678'})
+        
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.user.national_id, '0012345678')
@@ -0,0 +1,57 @@
+import re
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+_NON_DIGIT_RE = re.compile(r'\D+')
+_PERIOD_RE = re.compile(r'^(\d*)([smhd])')
+_PERIOD_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class PhoneNumberRateThrottle(SimpleRateThrottle):
+    """
+    Throttle requests per phone number in the request body (not per IP),
+    so rotating client addresses still hit the limit
+    Falls back to client IP when no phone number is sent
+    """
+    
+    def get_cache_key(self, request, view):
+        data = request.data
+        phone_number = data.get('phone_number') if hasattr(data, 'get') else None
+        if isinstance(phone_number, str):
+            ident = _NON_DIGIT_RE.sub('', phone_number)
+        else:
+            ident = None
+        
+        if not ident:
+            ident = self.get_ident(request)
+        
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': ident
+        }
+    
+    def parse_rate(self, rate):
+        """
+        Same as DRF's parser, but also accepts multi-unit periods like '3/10m'
+        """
+        if rate is None:
+            return (None, None)
+        num, period = rate.split('/')
+        match = _PERIOD_RE.match(period)
+        multiplier = int(match.group(1) or 1)
+        return (int(num), multiplier * _PERIOD_SECONDS[match.group(2)])
+
+
+class OTPRequestRateThrottle(PhoneNumberRateThrottle):
+    """
+    Limit OTP requests (SMS sends) per phone number
+    """
+    scope = 'otp_request'
+
+
+class OTPVerifyRateThrottle(PhoneNumberRateThrottle):
+    """
+    Limit OTP verification attempts per phone number
+    """
+    scope = 'otp_verify'
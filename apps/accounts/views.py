@@ -1,3 +1,8 @@
+import hashlib
+import json
+import logging
+import time
+
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -6,10 +11,14 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.db import IntegrityError, transaction
 from django.utils.http import http_date
-from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from core.swagger import swagger_auto_schema
+
 from .serializers import (
     PhoneNumberSerializer,
     OTPVerificationSerializer,
@@ -17,38 +26,67 @@ from .serializers import (
     TokenResponseSerializer
 )
 from .services import OTPService, KavehNegarService
+from .authentication import invalidate_cached_user
+from .throttles import OTPRequestRateThrottle, OTPVerifyRateThrottle
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+# Cookie names and attributes are fixed for the process lifetime, build them once
+_ACCESS_COOKIE_NAME = settings.COOKIE_ACCESS_TOKEN_NAME
+_REFRESH_COOKIE_NAME = settings.COOKIE_REFRESH_TOKEN_NAME
+_ACCESS_MAX_AGE = int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds())
+_REFRESH_MAX_AGE = int(settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds())
+_COOKIE_COMMON = dict(
+    path='/',
+    domain=None,
+    secure=settings.COOKIE_SECURE,
+    httponly=settings.COOKIE_HTTPONLY,
+    samesite=settings.COOKIE_SAMESITE,
+)
+
+# Access tokens minted by RefreshTokenView are reused for repeat refreshes
+# with the same refresh token (e.g. bursts when a mobile app resumes)
+REFRESH_CACHE_TIMEOUT = 30
+
+# Fixed success bodies, rendered once instead of through DRF on every call
+_LOGOUT_OK_BODY = json.dumps({'message': 'Logged out successfully'}).encode()
+_REFRESH_OK_BODY = json.dumps({'message': 'Token refreshed successfully'}).encode()
+
+# Shared response schema for endpoints that only return a message
+_MESSAGE_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'message': openapi.Schema(type=openapi.TYPE_STRING, description='پیام موفقیت'),
+    }
+)
+
 
+def _refresh_cache_key(refresh_token):
+    digest = hashlib.blake2b(refresh_token.encode(), digest_size=32).hexdigest()
+    return f'jwt_refresh:{digest}'
 
-def set_jwt_cookies(response, refresh_token):
+
+def set_jwt_cookies(response, access_token, refresh_token):
     """
     Helper function to set JWT tokens in HTTP-only cookies
+    Takes already encoded token strings, so each token is signed only once
     """
-    access_token = refresh_token.access_token
-    
     # Set access token cookie
     response.set_cookie(
-        key=settings.COOKIE_ACCESS_TOKEN_NAME,
-        value=str(access_token),
-        max_age=int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()),
-        path='/',
-        domain=None,
-        secure=settings.COOKIE_SECURE,
-        httponly=settings.COOKIE_HTTPONLY,
-        samesite=settings.COOKIE_SAMESITE,
+        key=_ACCESS_COOKIE_NAME,
+        value=access_token,
+        max_age=_ACCESS_MAX_AGE,
+        **_COOKIE_COMMON
     )
     
     # Set refresh token cookie
     response.set_cookie(
-        key=settings.COOKIE_REFRESH_TOKEN_NAME,
-        value=str(refresh_token),
-        max_age=int(settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds()),
-        path='/',
-        domain=None,
-        secure=settings.COOKIE_SECURE,
-        httponly=settings.COOKIE_HTTPONLY,
-        samesite=settings.COOKIE_SAMESITE,
+        key=_REFRESH_COOKIE_NAME,
+        value=refresh_token,
+        max_age=_REFRESH_MAX_AGE,
+        **_COOKIE_COMMON
     )
     
     return response
@@ -59,25 +97,17 @@ def clear_jwt_cookies(response):
     Helper function to clear JWT cookies (for logout)
     """
     response.set_cookie(
-        key=settings.COOKIE_ACCESS_TOKEN_NAME,
+        key=_ACCESS_COOKIE_NAME,
         value='',
         max_age=0,
-        path='/',
-        domain=None,
-        secure=settings.COOKIE_SECURE,
-        httponly=settings.COOKIE_HTTPONLY,
-        samesite=settings.COOKIE_SAMESITE,
+        **_COOKIE_COMMON
     )
     
     response.set_cookie(
-        key=settings.COOKIE_REFRESH_TOKEN_NAME,
+        key=_REFRESH_COOKIE_NAME,
         value='',
         max_age=0,
-        path='/',
-        domain=None,
-        secure=settings.COOKIE_SECURE,
-        httponly=settings.COOKIE_HTTPONLY,
-        samesite=settings.COOKIE_SAMESITE,
+        **_COOKIE_COMMON
     )
     
     return response
@@ -90,6 +120,7 @@ class RequestOTPView(APIView):
     این endpoint برای درخواست کد OTP استفاده می‌شود. کد OTP از طریق SMS به شماره تلفن ارسال می‌شود.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [OTPRequestRateThrottle]
     
     @swagger_auto_schema(
         operation_description="درخواست کد OTP برای ثبت نام یا ورود. کد OTP از طریق SMS ارسال می‌شود.",
@@ -124,42 +155,28 @@ class RequestOTPView(APIView):
         phone_number = serializer.validated_data['phone_number']
         purpose = serializer.validated_data['purpose']
         
+        user_exists = User.objects.filter(phone_number=phone_number).exists()
+        
         # For login, check if user exists
-        if purpose == 'login':
-            if not User.objects.filter(phone_number=phone_number).exists():
-                return Response(
-                    {'error': 'User with this phone number does not exist'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
+        if purpose == 'login' and not user_exists:
+            return Response(
+                {'error': 'User with this phone number does not exist'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
         # For register, check if user already exists
-        if purpose == 'register':
-            if User.objects.filter(phone_number=phone_number).exists():
-                return Response(
-                    {'error': 'User with this phone number already exists'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        if purpose == 'register' and user_exists:
+            return Response(
+                {'error': 'User with this phone number already exists'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         try:
             # Generate and create OTP
             otp_code, otp_instance = OTPService.create_otp(phone_number, purpose)
             
-            # Send OTP via SMS
-            try:
-                KavehNegarService.send_otp(phone_number, otp_code)
-            except Exception as e:
-                # Log error only in DEBUG mode
-                if settings.DEBUG:
-                    import traceback
-                    print(f"KavehNegar error: {str(e)}")
-                    print(traceback.format_exc())
-                return Response(
-                    {
-                        'error': 'Failed to send OTP. Please try again later.',
-                        'detail': str(e) if settings.DEBUG else None
-                    },
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+            # Send OTP via SMS in background
+            KavehNegarService.send_otp_in_background(phone_number, otp_code)
             
             expires_in = (otp_instance.expires_at - timezone.now()).total_seconds() / 60
             
@@ -177,11 +194,7 @@ class RequestOTPView(APIView):
                 status=status.HTTP_429_TOO_MANY_REQUESTS
             )
         except Exception as e:
-            # Log error only in DEBUG mode
-            if settings.DEBUG:
-                import traceback
-                print(f"Error in RequestOTPView: {str(e)}")
-                print(traceback.format_exc())
+            logger.exception("Error in RequestOTPView")
             return Response(
                 {'error': 'An error occurred. Please try again later.', 'detail': str(e) if settings.DEBUG else None},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -196,6 +209,7 @@ class VerifyOTPView(APIView):
     در صورت ثبت نام، کاربر جدید ایجاد می‌شود و در صورت ورود، کاربر احراز هویت می‌شود.
     """
     permission_classes = [AllowAny]
+    throttle_classes = [OTPVerifyRateThrottle]
     
     @swagger_auto_schema(
         operation_description="تایید کد OTP و دریافت JWT token. برای ثبت نام کاربر جدید ایجاد می‌شود و برای ورود کاربر احراز هویت می‌شود.",
@@ -211,6 +225,7 @@ class VerifyOTPView(APIView):
             ),
             400: openapi.Response(description="کد OTP نامعتبر یا منقضی شده"),
             404: openapi.Response(description="کاربر یافت نشد"),
+            429: openapi.Response(description="تعداد تلاش‌ها بیش از حد مجاز"),
         },
         tags=['Authentication']
     )
@@ -227,23 +242,33 @@ class VerifyOTPView(APIView):
         code = serializer.validated_data['code']
         purpose = serializer.validated_data['purpose']
         
-        # Verify OTP
-        otp_instance = OTPService.verify_otp(phone_number, code, purpose)
-        
-        if not otp_instance:
+        # Verify OTP and create the user in one transaction: the OTP is
+        # consumed by a single conditional UPDATE (concurrent verifies of the
+        # same code block on its row lock and then match nothing), and a
+        # failed registration rolls the consumption back
+        try:
+            with transaction.atomic():
+                if not OTPService.verify_otp(phone_number, code, purpose):
+                    return Response(
+                        {'error': 'Invalid or expired OTP code'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                if purpose == 'register':
+                    # The unique constraint settles registrations racing
+                    # past the existence check in RequestOTPView
+                    user = User.objects.create_user(
+                        phone_number=phone_number,
+                        is_phone_verified=True
+                    )
+        except IntegrityError:
             return Response(
-                {'error': 'Invalid or expired OTP code'},
+                {'error': 'User with this phone number already exists'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         # Handle registration
         if purpose == 'register':
-            # Create new user
-            user = User.objects.create_user(
-                phone_number=phone_number,
-                is_phone_verified=True
-            )
-            
             # Generate JWT tokens
             refresh = RefreshToken.for_user(user)
             
@@ -259,43 +284,48 @@ class VerifyOTPView(APIView):
             )
             
             # Set tokens in HTTP-only cookies
-            set_jwt_cookies(response, refresh)
+            set_jwt_cookies(response, str(refresh.access_token), str(refresh))
             
             return response
         
         # Handle login
         elif purpose == 'login':
-            try:
-                user = User.objects.get(phone_number=phone_number)
-                
-                # Update phone verification status if not already verified
-                if not user.is_phone_verified:
-                    user.is_phone_verified = True
-                    user.save()
-                
-                # Generate JWT tokens
-                refresh = RefreshToken.for_user(user)
-                
-                user_serializer = UserProfileSerializer(user)
-                
-                # Create response
-                response = Response(
-                    {
-                        'message': 'Login successful',
-                        'user': user_serializer.data
-                    },
-                    status=status.HTTP_200_OK
-                )
-                
-                # Set tokens in HTTP-only cookies
-                set_jwt_cookies(response, refresh)
-                
-                return response
-            except User.DoesNotExist:
+            user = User.objects.filter(phone_number=phone_number).first()
+            if user is None:
                 return Response(
                     {'error': 'User not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            
+            # Update phone verification status if not already verified;
+            # a single-column conditional UPDATE (auto_now is skipped by update())
+            if not user.is_phone_verified:
+                updated = User.objects.filter(
+                    pk=user.pk,
+                    is_phone_verified=False
+                ).update(is_phone_verified=True, updated_at=timezone.now())
+                if updated:
+                    user.is_phone_verified = True
+                    invalidate_cached_user(user.pk)
+            
+            # Generate JWT tokens
+            refresh = RefreshToken.for_user(user)
+            
+            user_serializer = UserProfileSerializer(user)
+            
+            # Create response
+            response = Response(
+                {
+                    'message': 'Login successful',
+                    'user': user_serializer.data
+                },
+                status=status.HTTP_200_OK
+            )
+            
+            # Set tokens in HTTP-only cookies
+            set_jwt_cookies(response, str(refresh.access_token), str(refresh))
+            
+            return response
 
 
 class LogoutView(APIView):
@@ -310,12 +340,7 @@ class LogoutView(APIView):
         responses={
             200: openapi.Response(
                 description="خروج موفقیت‌آمیز",
-                schema=openapi.Schema(
-                    type=openapi.TYPE_OBJECT,
-                    properties={
-                        'message': openapi.Schema(type=openapi.TYPE_STRING, description='پیام موفقیت'),
-                    }
-                )
+                schema=_MESSAGE_SCHEMA
             ),
             401: openapi.Response(description="نیاز به احراز هویت"),
         },
@@ -326,13 +351,11 @@ class LogoutView(APIView):
         """
         Logout user by clearing JWT cookies
         """
-        response = Response(
-            {'message': 'Logged out successfully'},
-            status=status.HTTP_200_OK
-        )
+        response = HttpResponse(_LOGOUT_OK_BODY, content_type='application/json')
         
         # Clear JWT cookies
         clear_jwt_cookies(response)
+        invalidate_cached_user(request.user.pk)
         
         return response
 
@@ -348,12 +371,7 @@ class RefreshTokenView(APIView):
         responses={
             200: openapi.Response(
                 description="Token با موفقیت تازه‌سازی شد",
-                schema=openapi.Schema(
-                    type=openapi.TYPE_OBJECT,
-                    properties={
-                        'message': openapi.Schema(type=openapi.TYPE_STRING, description='پیام موفقیت'),
-                    }
-                )
+                schema=_MESSAGE_SCHEMA
             ),
             401: openapi.Response(description="Refresh token نامعتبر"),
         },
@@ -363,7 +381,7 @@ class RefreshTokenView(APIView):
         """
         Refresh access token using refresh token from cookie
         """
-        refresh_token = request.COOKIES.get(settings.COOKIE_REFRESH_TOKEN_NAME)
+        refresh_token = request.COOKIES.get(_REFRESH_COOKIE_NAME)
         
         if not refresh_token:
             return Response(
@@ -372,25 +390,26 @@ class RefreshTokenView(APIView):
             )
         
         try:
-            refresh = RefreshToken(refresh_token)
-            access_token = refresh.access_token
+            cache_key = _refresh_cache_key(refresh_token)
+            access_token = cache.get(cache_key)
+            if access_token is None:
+                refresh = RefreshToken(refresh_token)
+                access_token = str(refresh.access_token)
+                
+                # Never serve the cached access token past the refresh token's expiry
+                timeout = min(REFRESH_CACHE_TIMEOUT, int(refresh['exp'] - time.time()))
+                if timeout > 0:
+                    cache.set(cache_key, access_token, timeout)
             
             # Create response
-            response = Response(
-                {'message': 'Token refreshed successfully'},
-                status=status.HTTP_200_OK
-            )
+            response = HttpResponse(_REFRESH_OK_BODY, content_type='application/json')
             
             # Update access token cookie
             response.set_cookie(
-                key=settings.COOKIE_ACCESS_TOKEN_NAME,
-                value=str(access_token),
-                max_age=int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()),
-                path='/',
-                domain=None,
-                secure=settings.COOKIE_SECURE,
-                httponly=settings.COOKIE_HTTPONLY,
-                samesite=settings.COOKIE_SAMESITE,
+                key=_ACCESS_COOKIE_NAME,
+                value=access_token,
+                max_age=_ACCESS_MAX_AGE,
+                **_COOKIE_COMMON
             )
             
             return response
@@ -448,14 +467,18 @@ class UserProfileView(APIView):
         """
         Update user profile (currently only phone_verified can be updated)
         """
+        # request.user may come from the user cache; save a fresh row so
+        # stale fields (e.g. is_active) are never written back
+        user = User.objects.get(pk=request.user.pk)
         serializer = UserProfileSerializer(
-            request.user,
+            user,
             data=request.data,
             partial=True
         )
         
         if serializer.is_valid():
             serializer.save()
+            invalidate_cached_user(request.user.pk)
             return Response(serializer.data, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
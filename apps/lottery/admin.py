@@ -5,7 +5,9 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from .models import Ticket
 from .services import LotteryService, KavehNegarLotteryService
-from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 @admin.action(description='اجرای قرعه کشی برای تیکت‌های هفته جاری')
@@ -14,11 +16,17 @@ def run_lottery_action(modeladmin, request, queryset):
     Admin action to run lottery manually
     """
     try:
-        # Get tickets for current week
-        tickets = LotteryService.get_current_week_tickets()
-        tickets_count = tickets.count()
+        # A second click must not draw another set of winners
+        if LotteryService.is_current_week_drawn():
+            modeladmin.message_user(
+                request,
+                'قرعه کشی این هفته قبلاً انجام شده است',
+                level=messages.WARNING
+            )
+            return
         
-        if tickets_count == 0:
+        # Check for pending tickets in current week
+        if not LotteryService.get_current_week_tickets().exists():
             modeladmin.message_user(
                 request,
                 'هیچ تیکت pending برای هفته جاری یافت نشد',
@@ -28,23 +36,29 @@ def run_lottery_action(modeladmin, request, queryset):
         
         # Select winners
         winners = LotteryService.select_winners()
-        winner_count = winners.count()
+        winner_count = len(winners)
+        
+        if not winners:
+            # Drawn by a concurrent run meanwhile
+            modeladmin.message_user(
+                request,
+                'قرعه کشی این هفته قبلاً انجام شده است',
+                level=messages.WARNING
+            )
+            return
         
         # Send SMS to winners
-        success_count = 0
+        results = KavehNegarLotteryService.send_winner_sms_bulk(
+            (winner.user.phone_number, winner.ticket_number)
+            for winner in winners
+        )
         fail_count = 0
         
-        for winner in winners:
-            try:
-                KavehNegarLotteryService.send_winner_sms(
-                    winner.user.phone_number,
-                    winner.ticket_number
-                )
-                success_count += 1
-            except Exception as e:
+        for phone_number, ticket_number, error in results:
+            if error is not None:
                 fail_count += 1
-                if settings.DEBUG:
-                    print(f"Failed to send SMS to {winner.user.phone_number}: {str(e)}")
+                logger.error("Failed to send SMS to %s: %s", phone_number, error)
+        success_count = len(results) - fail_count
         
         modeladmin.message_user(
             request,
@@ -3,7 +3,9 @@ from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_protect
 from .services import LotteryService, KavehNegarLotteryService
-from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 @staff_member_required
@@ -13,11 +15,13 @@ def run_lottery_manual(request):
     Manual lottery execution from admin panel
     """
     try:
-        # Get tickets for current week
-        tickets = LotteryService.get_current_week_tickets()
-        tickets_count = tickets.count()
+        # A second click must not draw another set of winners
+        if LotteryService.is_current_week_drawn():
+            messages.warning(request, 'قرعه کشی این هفته قبلاً انجام شده است')
+            return redirect('admin:lottery_ticket_changelist')
         
-        if tickets_count == 0:
+        # Check for pending tickets in current week
+        if not LotteryService.get_current_week_tickets().exists():
             messages.warning(
                 request,
                 'هیچ تیکت pending برای هفته جاری یافت نشد'
@@ -26,23 +30,24 @@ def run_lottery_manual(request):
         
         # Select winners
         winners = LotteryService.select_winners()
-        winner_count = winners.count()
+        winner_count = len(winners)
+        if not winners:
+            # Drawn by a concurrent run meanwhile
+            messages.warning(request, 'قرعه کشی این هفته قبلاً انجام شده است')
+            return redirect('admin:lottery_ticket_changelist')
         
         # Send SMS to winners
-        success_count = 0
+        results = KavehNegarLotteryService.send_winner_sms_bulk(
+            (winner.user.phone_number, winner.ticket_number)
+            for winner in winners
+        )
         fail_count = 0
         
-        for winner in winners:
-            try:
-                KavehNegarLotteryService.send_winner_sms(
-                    winner.user.phone_number,
-                    winner.ticket_number
-                )
-                success_count += 1
-            except Exception as e:
+        for phone_number, ticket_number, error in results:
+            if error is not None:
                 fail_count += 1
-                if settings.DEBUG:
-                    print(f"Failed to send SMS to {winner.user.phone_number}: {str(e)}")
+                logger.error("Failed to send SMS to %s: %s", phone_number, error)
+        success_count = len(results) - fail_count
         
         messages.success(
             request,
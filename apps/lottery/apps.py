@@ -19,10 +19,10 @@ class LotteryConfig(AppConfig):
             try:
                 from .scheduler import start_scheduler
                 start_scheduler()
-            except Exception as e:
+            except Exception:
                 # Log error but don't fail app startup
                 import logging
                 logger = logging.getLogger(__name__)
-                logger.error(f"Failed to start lottery scheduler: {str(e)}")
+                logger.exception("Failed to start lottery scheduler")
 
 
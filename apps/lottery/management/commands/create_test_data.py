@@ -4,13 +4,21 @@ Management command to create test data for lottery system
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from django.db import connection
 from datetime import timedelta
 from apps.lottery.models import Ticket
 import random
+try:
+    from zoneinfo import ZoneInfo
+    TEHRAN_TZ = ZoneInfo('Asia/Tehran')
+except ImportError:
+    import pytz
+    TEHRAN_TZ = pytz.timezone('Asia/Tehran')
 
 User = get_user_model()
 
+# Rows per INSERT/UPDATE statement
+BATCH_SIZE = 1000
+
 
 class Command(BaseCommand):
     help = 'Create test data for lottery system'
@@ -35,20 +43,34 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS(f'Creating {num_users} test users...'))
         
-        # Create users
-        users = []
-        for i in range(num_users):
-            phone_number = f"{phone_prefix}{i}"
-            user, created = User.objects.get_or_create(
-                phone_number=phone_number,
-                defaults={'is_phone_verified': True}
+        # Create users (existing ones are looked up in bulk and kept)
+        phone_numbers = [f"{phone_prefix}{i}" for i in range(num_users)]
+        existing = User.objects.in_bulk(phone_numbers, field_name='phone_number')
+        created = {
+            user.phone_number: user
+            for user in User.objects.bulk_create(
+                [
+                    User(phone_number=phone_number, is_phone_verified=True)
+                    for phone_number in phone_numbers
+                    if phone_number not in existing
+                ],
+                batch_size=BATCH_SIZE
             )
-            if created:
-                users.append(user)
-                self.stdout.write(self.style.SUCCESS(f'  Created user: {phone_number}'))
+        }
+        
+        users = []
+        lines = []
+        for phone_number in phone_numbers:
+            if phone_number in created:
+                users.append(created[phone_number])
+                lines.append(self.style.SUCCESS(f'  Created user: {phone_number}'))
             else:
-                users.append(user)
-                self.stdout.write(self.style.WARNING(f'  User already exists: {phone_number}'))
+                users.append(existing[phone_number])
+                lines.append(self.style.WARNING(f'  User already exists: {phone_number}'))
+        
+        # Write per-user lines at once
+        if lines:
+            self.stdout.write('\n'.join(lines))
         
         # Create tickets with different statuses
         self.stdout.write(self.style.SUCCESS('\nCreating test tickets...'))
@@ -57,85 +79,67 @@ class Command(BaseCommand):
         week_start = self.get_current_week_start(now)
         
         # Create pending tickets for current week
-        pending_count = 0
-        for i, user in enumerate(users[:5]):
-            ticket = Ticket.objects.create(
-                user=user,
-                status='pending'
-            )
-            # Set created_at to current week using direct SQL update
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "UPDATE lottery_tickets SET created_at = %s WHERE id = %s",
-                    [week_start + timedelta(days=i % 3), ticket.id]
-                )
-            pending_count += 1
+        pending_count = self.bulk_create_tickets([
+            (Ticket(user=user, status='pending'), week_start + timedelta(days=i % 3))
+            for i, user in enumerate(users[:5])
+        ])
         
         self.stdout.write(self.style.SUCCESS(f'  Created {pending_count} pending tickets'))
         
         # Create won tickets (some from current week, some from previous weeks)
-        won_count = 0
-        for i, user in enumerate(users[5:8]):
-            # Create ticket first without received_date to avoid DateField issue
-            ticket = Ticket.objects.create(
-                user=user,
-                status='won',
-                full_name=f'کاربر تست {i+1}',
-                national_id=f'123456789{i}',
-                selected_period='ناهار',
-                quantity=random.randint(1, 3)
+        won_count = self.bulk_create_tickets([
+            (
+                Ticket(
+                    user=user,
+                    status='won',
+                    full_name=f'کاربر تست {i+1}',
+                    national_id=f'123456789{i}',
+                    received_date='پنجشنبه',
+                    selected_period='ناهار',
+                    quantity=random.randint(1, 3)
+                ),
+                week_start + timedelta(days=i % 3)
             )
-            # Update received_date and created_at using direct SQL
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "UPDATE lottery_tickets SET received_date = %s, created_at = %s WHERE id = %s",
-                    ['پنجشنبه', week_start + timedelta(days=i % 3), ticket.id]
-                )
-            won_count += 1
+            for i, user in enumerate(users[5:8])
+        ])
         
         self.stdout.write(self.style.SUCCESS(f'  Created {won_count} won tickets (current week)'))
         
         # Create old won tickets (more than 6 months ago)
-        old_won_count = 0
-        for i, user in enumerate(users[8:10]):
-            # Create ticket first without received_date to avoid DateField issue
-            ticket = Ticket.objects.create(
-                user=user,
-                status='won',
-                full_name=f'کاربر قدیمی {i+1}',
-                national_id=f'987654321{i}',
-                selected_period='ناهار',
-                quantity=2
+        old_won_count = self.bulk_create_tickets([
+            (
+                Ticket(
+                    user=user,
+                    status='won',
+                    full_name=f'کاربر قدیمی {i+1}',
+                    national_id=f'987654321{i}',
+                    received_date='پنجشنبه',
+                    selected_period='ناهار',
+                    quantity=2
+                ),
+                now - timedelta(days=210)
             )
-            # Update received_date and created_at using direct SQL
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "UPDATE lottery_tickets SET received_date = %s, created_at = %s WHERE id = %s",
-                    ['پنجشنبه', now - timedelta(days=210), ticket.id]
-                )
-            old_won_count += 1
+            for i, user in enumerate(users[8:10])
+        ])
         
         self.stdout.write(self.style.SUCCESS(f'  Created {old_won_count} old won tickets (7 months ago)'))
         
         # Create cancelled tickets
-        cancelled_count = 0
-        for i, user in enumerate(users[:2]):
-            # Create ticket first without received_date to avoid DateField issue
-            ticket = Ticket.objects.create(
-                user=user,
-                status='cancelled',
-                full_name=f'کاربر لغو شده {i+1}',
-                national_id=f'111111111{i}',
-                selected_period='ناهار',
-                quantity=1
+        cancelled_count = self.bulk_create_tickets([
+            (
+                Ticket(
+                    user=user,
+                    status='cancelled',
+                    full_name=f'کاربر لغو شده {i+1}',
+                    national_id=f'111111111{i}',
+                    received_date='پنجشنبه',
+                    selected_period='ناهار',
+                    quantity=1
+                ),
+                week_start + timedelta(days=i)
             )
-            # Update received_date and created_at using direct SQL
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "UPDATE lottery_tickets SET received_date = %s, created_at = %s WHERE id = %s",
-                    ['پنجشنبه', week_start + timedelta(days=i), ticket.id]
-                )
-            cancelled_count += 1
+            for i, user in enumerate(users[:2])
+        ])
         
         self.stdout.write(self.style.SUCCESS(f'  Created {cancelled_count} cancelled tickets'))
         
@@ -146,19 +150,25 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'   - Old won tickets: {old_won_count}'))
         self.stdout.write(self.style.SUCCESS(f'   - Cancelled tickets: {cancelled_count}'))
     
+    def bulk_create_tickets(self, tickets_with_dates):
+        """
+        Insert tickets in batches with their created_at set up front
+        Returns number of created tickets
+        """
+        tickets = []
+        for ticket, created_at in tickets_with_dates:
+            ticket.ticket_number = Ticket.generate_ticket_number()
+            ticket.created_at = created_at
+            tickets.append(ticket)
+        
+        return len(Ticket.objects.bulk_create(tickets, batch_size=BATCH_SIZE))
+    
     def get_current_week_start(self, now):
         """
         Get the start of current lottery week (Saturday 8 AM Tehran time)
         """
-        try:
-            from zoneinfo import ZoneInfo
-            tehran_tz = ZoneInfo('Asia/Tehran')
-        except ImportError:
-            import pytz
-            tehran_tz = pytz.timezone('Asia/Tehran')
-        
         # Convert to Tehran timezone
-        now_tehran = now.astimezone(tehran_tz)
+        now_tehran = now.astimezone(TEHRAN_TZ)
         
         # Find the most recent Saturday 8 AM
         days_since_saturday = (now_tehran.weekday() - 5) % 7
@@ -18,58 +18,60 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Starting lottery...')
         
-        # Get tickets for current week
-        tickets = LotteryService.get_current_week_tickets()
-        tickets_count = tickets.count()
+        # Get winner count
+        winner_count = options.get('count') or settings.LOTTERY_WINNERS_COUNT
         
-        self.stdout.write(f'Found {tickets_count} pending tickets for current week')
+        # Select winners from current week's tickets; fewer winners are
+        # selected when there are fewer tickets
+        self.stdout.write(f'Selecting {winner_count} winners...')
+        winners = LotteryService.select_winners(winner_count)
         
-        if tickets_count == 0:
-            self.stdout.write(self.style.WARNING('No tickets found for current week'))
+        if not winners:
+            if LotteryService.is_current_week_drawn():
+                self.stdout.write(self.style.WARNING('Lottery already drawn for current week'))
+            else:
+                self.stdout.write(self.style.WARNING('No tickets found for current week'))
             return
         
-        # Get winner count
-        winner_count = options.get('count') or settings.LOTTERY_WINNERS_COUNT
-        
-        if tickets_count < winner_count:
+        if len(winners) < winner_count:
             self.stdout.write(
                 self.style.WARNING(
-                    f'Only {tickets_count} tickets available, selecting {tickets_count} winners instead of {winner_count}'
+                    f'Only {len(winners)} tickets available, selected {len(winners)} winners instead of {winner_count}'
                 )
             )
-            winner_count = tickets_count
         
-        # Select winners
-        self.stdout.write(f'Selecting {winner_count} winners...')
-        winners = LotteryService.select_winners(winner_count)
-        
-        self.stdout.write(self.style.SUCCESS(f'Selected {winners.count()} winners'))
+        self.stdout.write(self.style.SUCCESS(f'Selected {len(winners)} winners'))
         
         # Send SMS to winners
         self.stdout.write('Sending SMS to winners...')
         success_count = 0
         fail_count = 0
         
-        for winner in winners:
-            try:
-                KavehNegarLotteryService.send_winner_sms(
-                    winner.user.phone_number,
-                    winner.ticket_number
-                )
+        results = KavehNegarLotteryService.send_winner_sms_bulk(
+            (winner.user.phone_number, winner.ticket_number) for winner in winners
+        )
+        
+        # Collect per-winner lines and write them at once
+        lines = []
+        for phone_number, ticket_number, error in results:
+            if error is None:
                 success_count += 1
-                self.stdout.write(
+                lines.append(
                     self.style.SUCCESS(
-                        f'SMS sent to {winner.user.phone_number} (Ticket: {winner.ticket_number})'
+                        f'SMS sent to {phone_number} (Ticket: {ticket_number})'
                     )
                 )
-            except Exception as e:
+            else:
                 fail_count += 1
-                self.stdout.write(
+                lines.append(
                     self.style.ERROR(
-                        f'Failed to send SMS to {winner.user.phone_number}: {str(e)}'
+                        f'Failed to send SMS to {phone_number}: {str(error)}'
                     )
                 )
         
+        if lines:
+            self.stdout.write('\n'.join(lines))
+        
         self.stdout.write(
             self.style.SUCCESS(
                 f'Lottery completed! Winners: {success_count}, Failed SMS: {fail_count}'
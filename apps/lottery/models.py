@@ -1,10 +1,16 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth import get_user_model
-import random
+from django.utils import timezone
+import secrets
 import string
 
 User = get_user_model()
 
+TICKET_NUMBER_ALPHABET = string.ascii_uppercase + string.digits
+TICKET_NUMBER_LENGTH = 10
+# Attempts at inserting with a fresh ticket number before giving up
+TICKET_NUMBER_MAX_ATTEMPTS = 3
+
 
 class Ticket(models.Model):
     """
@@ -27,7 +33,6 @@ class Ticket(models.Model):
     ticket_number = models.CharField(
         max_length=20,
         unique=True,
-        db_index=True,
         help_text="شماره ژتون (رندوم از سمت سرور)"
     )
     national_id = models.CharField(
@@ -63,10 +68,11 @@ class Ticket(models.Model):
         max_length=20,
         choices=STATUS_CHOICES,
         default='pending',
-        db_index=True,
         help_text="وضعیت تیکت"
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Same as auto_now_add, but an explicit value (e.g. bulk-created test
+    # data) is kept on insert
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -75,9 +81,14 @@ class Ticket(models.Model):
         verbose_name_plural = 'Tickets'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['ticket_number']),
+            # Weekly participation check and history (read backwards for
+            # newest-first, so no separate descending index)
             models.Index(fields=['user', 'created_at']),
-            models.Index(fields=['status']),
+            # Recent-win check and the user's won ticket lookup
+            models.Index(fields=['user', 'status', 'created_at']),
+            # Current week's pending tickets and winners; also serves
+            # status-only lookups, so no separate status index
+            models.Index(fields=['status', 'created_at']),
         ]
     
     def __str__(self):
@@ -86,24 +97,33 @@ class Ticket(models.Model):
     @staticmethod
     def generate_ticket_number():
         """
-        Generate a random unique ticket number
-        Format: Random alphanumeric string
+        Generate a random ticket number
+        Format: Random alphanumeric string (10 characters)
+        Uniqueness is enforced by the unique constraint on insert
         """
-        while True:
-            # Generate random ticket number (10 characters)
-            ticket_number = ''.join(
-                random.choices(string.ascii_uppercase + string.digits, k=10)
-            )
-            
-            # Check if it already exists
-            if not Ticket.objects.filter(ticket_number=ticket_number).exists():
-                return ticket_number
+        return ''.join(
+            secrets.choice(TICKET_NUMBER_ALPHABET)
+            for _ in range(TICKET_NUMBER_LENGTH)
+        )
     
     def save(self, *args, **kwargs):
         """
         Override save to auto-generate ticket_number if not provided
+        A clash with an existing ticket number is retried with a new one
         """
-        if not self.ticket_number:
+        if self.ticket_number:
+            return super().save(*args, **kwargs)
+        
+        for attempt in range(TICKET_NUMBER_MAX_ATTEMPTS):
             self.ticket_number = self.generate_ticket_number()
-        super().save(*args, **kwargs)
+            try:
+                # Savepoint, so a failed insert doesn't break an outer transaction
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                is_last_attempt = attempt == TICKET_NUMBER_MAX_ATTEMPTS - 1
+                if is_last_attempt or not Ticket.objects.filter(ticket_number=self.ticket_number).exists():
+                    # Not a ticket number clash (or out of attempts)
+                    self.ticket_number = ''
+                    raise
 
@@ -3,148 +3,144 @@ Scheduler for automatic lottery execution
 Runs every Wednesday at 8 PM Tehran time
 """
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_RUNNING
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 try:
     from zoneinfo import ZoneInfo
+    TEHRAN_TZ = ZoneInfo('Asia/Tehran')
 except ImportError:
     import pytz
+    TEHRAN_TZ = pytz.timezone('Asia/Tehran')
 from django.conf import settings
 from django.utils import timezone
-from django_apscheduler.jobstores import DjangoJobStore, register_events
-from django_apscheduler.models import DjangoJobExecution
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Running scheduler, set by start_scheduler
+_scheduler = None
+
 
 def run_lottery_job():
     """
     Job function to run lottery
     This will be called automatically every Wednesday at 8 PM Tehran time
     """
-    from apps.lottery.services import LotteryService, KavehNegarLotteryService
+    from apps.lottery.services import LotteryService
     
     try:
         logger.info("Starting automatic lottery execution...")
         
-        # Get tickets for current week
-        tickets = LotteryService.get_current_week_tickets()
-        tickets_count = tickets.count()
+        # Select winners; none when there are no pending tickets this week
+        # or it has already been drawn
+        winners = LotteryService.select_winners()
+        winner_count = len(winners)
         
-        if tickets_count == 0:
-            logger.warning("No pending tickets found for current week")
+        if winner_count == 0:
+            logger.warning("No winners selected for current week")
             return
         
-        # Select winners
-        winners = LotteryService.select_winners()
-        winner_count = winners.count()
-        
-        logger.info(f"Selected {winner_count} winners")
+        logger.info("Selected %d winners", winner_count)
         
         # Send SMS to winners
-        success_count = 0
-        fail_count = 0
-        
-        for winner in winners:
-            try:
-                KavehNegarLotteryService.send_winner_sms(
-                    winner.user.phone_number,
-                    winner.ticket_number
-                )
-                success_count += 1
-                logger.info(f"SMS sent to {winner.user.phone_number} (Ticket: {winner.ticket_number})")
-            except Exception as e:
-                fail_count += 1
-                logger.error(f"Failed to send SMS to {winner.user.phone_number}: {str(e)}")
+        recipients = [(winner.user.phone_number, winner.ticket_number) for winner in winners]
         
-        logger.info(f"Lottery completed! Winners: {winner_count}, SMS sent: {success_count}, Failed: {fail_count}")
+        if _scheduler is not None and _scheduler.state == STATE_RUNNING:
+            # Hand SMS sending to a one-off job, so a slow SMS provider
+            # doesn't hold up the lottery job
+            _scheduler.add_job(
+                send_winner_sms_job,
+                args=[recipients],
+                name='Send Lottery Winner SMS',
+                misfire_grace_time=None,
+            )
+            logger.info("Lottery completed! Winners: %d, SMS queued", winner_count)
+        else:
+            send_winner_sms_job(recipients)
         
-    except Exception as e:
-        logger.error(f"Error in lottery execution: {str(e)}")
+    except Exception:
+        logger.exception("Error in lottery execution")
 
 
-def cancel_incomplete_winners():
+def send_winner_sms_job(recipients):
     """
-    Cancel tickets of winners who didn't complete their info by Thursday 8 AM
-    This runs every Thursday at 8 AM Tehran time
+    Send SMS to lottery winners
+    recipients: list of (phone_number, ticket_number)
     """
-    from apps.lottery.models import Ticket
-    from datetime import timedelta
-    from django.utils import timezone
+    from apps.lottery.services import KavehNegarLotteryService
     
-    try:
-        from zoneinfo import ZoneInfo
-        tehran_tz = ZoneInfo('Asia/Tehran')
-    except ImportError:
-        import pytz
-        tehran_tz = pytz.timezone('Asia/Tehran')
+    success_count = 0
+    fail_count = 0
     
-    now_tehran = timezone.now().astimezone(tehran_tz)
+    results = KavehNegarLotteryService.send_winner_sms_bulk(recipients)
     
-    # Get all won tickets
-    won_tickets = Ticket.objects.filter(status='won')
+    for phone_number, ticket_number, error in results:
+        if error is None:
+            success_count += 1
+            logger.info("SMS sent to %s (Ticket: %s)", phone_number, ticket_number)
+        else:
+            fail_count += 1
+            logger.error("Failed to send SMS to %s: %s", phone_number, error)
     
-    cancelled_count = 0
+    logger.info("Winner SMS completed! Sent: %d, Failed: %d", success_count, fail_count)
+
+
+def cancel_incomplete_winners():
+    """
+    Cancel tickets of winners who didn't complete their info by Thursday 8 AM
+    This runs every Thursday at 8 AM Tehran time
+    """
+    from apps.lottery.models import Ticket
+    from apps.lottery.services import LotteryService
+    from django.db.models import Q
     
-    for ticket in won_tickets:
-        # Calculate deadline for this specific ticket
-        # Deadline is Thursday 8 AM after the ticket was created (Wednesday 8 PM)
-        ticket_created_tehran = ticket.created_at.astimezone(tehran_tz)
-        ticket_weekday = ticket_created_tehran.weekday()
-        
-        # Find the Thursday 8 AM after ticket creation
-        if ticket_weekday == 2:  # Wednesday (lottery day)
-            # Deadline is next day (Thursday) 8 AM
-            days_to_thursday = 1
-        else:
-            # Calculate days to next Thursday
-            days_to_thursday = (3 - ticket_weekday) % 7
-            if days_to_thursday == 0:
-                days_to_thursday = 7
-        
-        deadline = ticket_created_tehran.replace(hour=8, minute=0, second=0, microsecond=0)
-        deadline = deadline + timedelta(days=days_to_thursday)
-        
-        # Check if deadline has passed and ticket is incomplete
-        if now_tehran >= deadline:
-            # Check if ticket is incomplete (any required field is missing)
-            is_incomplete = (
-                not ticket.full_name or
-                not ticket.national_id or
-                not ticket.received_date or
-                not ticket.selected_period or
-                ticket.quantity is None
-            )
-            
-            if is_incomplete:
-                ticket.status = 'cancelled'
-                ticket.save()
-                cancelled_count += 1
-                logger.info(f"Cancelled incomplete ticket {ticket.ticket_number} (User: {ticket.user.phone_number})")
+    # Won tickets past their deadline with any required field missing
+    cancelled_count = Ticket.objects.filter(
+        status='won',
+        created_at__lt=LotteryService.get_info_deadline_cutoff()
+    ).filter(
+        Q(full_name__isnull=True) | Q(full_name='') |
+        Q(national_id__isnull=True) | Q(national_id='') |
+        Q(received_date__isnull=True) | Q(received_date='') |
+        Q(selected_period__isnull=True) | Q(selected_period='') |
+        Q(quantity__isnull=True)
+    ).update(status='cancelled', updated_at=timezone.now())
     
-    logger.info(f"Cancelled {cancelled_count} incomplete winner tickets")
+    logger.info("Cancelled %d incomplete winner tickets", cancelled_count)
     
     return cancelled_count
 
 
+def cleanup_expired_otps_job():
+    """
+    Delete expired OTP codes
+    This runs every 5 minutes
+    """
+    from apps.accounts.services import OTPService
+    
+    try:
+        deleted_count = OTPService.cleanup_expired_otps()
+        if deleted_count:
+            logger.info("Deleted %d expired OTP codes", deleted_count)
+    except Exception:
+        logger.exception("Error in expired OTP cleanup")
+
+
 def start_scheduler():
     """
     Start the scheduler for automatic lottery execution
     """
-    try:
-        from zoneinfo import ZoneInfo
-        tehran_tz = ZoneInfo('Asia/Tehran')
-    except ImportError:
-        import pytz
-        tehran_tz = pytz.timezone('Asia/Tehran')
+    global _scheduler
     
-    scheduler = BackgroundScheduler(timezone=tehran_tz)
-    scheduler.add_jobstore(DjangoJobStore(), "default")
+    # Jobs are fixed and re-added on every start, so the default in-memory
+    # job store is enough; no database round-trips per trigger
+    scheduler = BackgroundScheduler(timezone=TEHRAN_TZ)
     
     # Schedule lottery to run every Wednesday at 8 PM Tehran time
     scheduler.add_job(
         run_lottery_job,
-        trigger=CronTrigger(day_of_week='wed', hour=20, minute=0, timezone=tehran_tz),
+        trigger=CronTrigger(day_of_week='wed', hour=20, minute=0, timezone=TEHRAN_TZ),
         id='lottery_job',
         name='Run Lottery Every Wednesday 8 PM',
         replace_existing=True,
@@ -153,14 +149,22 @@ def start_scheduler():
     # Schedule cancellation job to run every Thursday at 8 AM Tehran time
     scheduler.add_job(
         cancel_incomplete_winners,
-        trigger=CronTrigger(day_of_week='thu', hour=8, minute=0, timezone=tehran_tz),
+        trigger=CronTrigger(day_of_week='thu', hour=8, minute=0, timezone=TEHRAN_TZ),
         id='cancel_incomplete_winners_job',
         name='Cancel Incomplete Winners Every Thursday 8 AM',
         replace_existing=True,
     )
     
-    register_events(scheduler)
+    # Purge expired OTP codes every 5 minutes
+    scheduler.add_job(
+        cleanup_expired_otps_job,
+        trigger=IntervalTrigger(minutes=5),
+        id='cleanup_expired_otps_job',
+        name='Delete Expired OTP Codes Every 5 Minutes',
+        replace_existing=True,
+    )
     
     scheduler.start()
+    _scheduler = scheduler
     logger.info("Lottery scheduler started. Will run every Wednesday at 8 PM Tehran time.")
     logger.info("Cancellation job scheduled. Will run every Thursday at 8 AM Tehran time.")
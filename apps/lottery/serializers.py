@@ -1,6 +1,12 @@
+import re
+
 from rest_framework import serializers
 from .models import Ticket
 
+# Persian and Arabic-Indic digits to ASCII
+_DIGIT_TRANSLATION = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+_NON_DIGIT_RE = re.compile(r'[^0-9]+')
+
 
 class TicketSerializer(serializers.ModelSerializer):
     """
@@ -71,7 +77,7 @@ class WinnerInfoSerializer(serializers.Serializer):
         """
         Validate national ID format
         """
-        cleaned = ''.join(filter(str.isdigit, value))
+        cleaned = _NON_DIGIT_RE.sub('', value.translate(_DIGIT_TRANSLATION))
         
         if len(cleaned) != 10:
             raise serializers.ValidationError("کد ملی باید 10 رقم باشد")
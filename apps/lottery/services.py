@@ -1,10 +1,61 @@
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
-from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count, Max, Prefetch, Q, prefetch_related_objects
+from datetime import datetime, timedelta
+from functools import lru_cache
 from .models import Ticket
-import random
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+import logging
+try:
+    from zoneinfo import ZoneInfo
+    TEHRAN_TZ = ZoneInfo('Asia/Tehran')
+except ImportError:
+    import pytz
+    TEHRAN_TZ = pytz.timezone('Asia/Tehran')
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# pg_advisory_xact_lock key serializing lottery draws
+LOTTERY_DRAW_LOCK_ID = 0x4C4F5454  # 'LOTT'
+
+# Cached winners are keyed by their version, so entries for outdated
+# versions are never read again and just expire
+WINNERS_CACHE_TIMEOUT = 3600
+
+
+@lru_cache(maxsize=2)
+def _week_start_for_minute(minute):
+    """
+    Start of the week (Saturday 8 AM Tehran time, as UTC) containing the
+    given minute since epoch
+    The week starts on a minute boundary, so every instant within a minute
+    shares the result and it is computed once per minute
+    """
+    now_tehran = datetime.fromtimestamp(minute * 60, tz=TEHRAN_TZ)
+    current_weekday = now_tehran.weekday()
+    
+    # Calculate start of week (Saturday 8 AM)
+    if current_weekday == 5:  # Saturday
+        if now_tehran.hour < 8:
+            days_to_saturday = 7
+        else:
+            days_to_saturday = 0
+    else:
+        days_to_saturday = (current_weekday - 5) % 7
+        if days_to_saturday == 0:
+            days_to_saturday = 7
+    
+    saturday_8am = now_tehran.replace(hour=8, minute=0, second=0, microsecond=0)
+    saturday_8am = saturday_8am - timedelta(days=days_to_saturday)
+    
+    return saturday_8am.astimezone(timezone.utc)
 
 
 class LotteryService:
@@ -18,32 +69,27 @@ class LotteryService:
         Get the start of current week (Saturday 8 AM Tehran time)
         Returns datetime in UTC (timezone-aware)
         """
-        try:
-            from zoneinfo import ZoneInfo
-            tehran_tz = ZoneInfo('Asia/Tehran')
-        except ImportError:
-            import pytz
-            tehran_tz = pytz.timezone('Asia/Tehran')
-        
-        now_tehran = timezone.now().astimezone(tehran_tz)
-        current_weekday = now_tehran.weekday()
-        
-        # Calculate start of week (Saturday 8 AM)
-        if current_weekday == 5:  # Saturday
-            if now_tehran.hour < 8:
-                days_to_saturday = 7
-            else:
-                days_to_saturday = 0
-        else:
-            days_to_saturday = (current_weekday - 5) % 7
-            if days_to_saturday == 0:
-                days_to_saturday = 7
+        return _week_start_for_minute(int(timezone.now().timestamp() // 60))
+    
+    @staticmethod
+    def get_info_deadline_cutoff():
+        """
+        Winners must complete their info by 8 AM Tehran time on the first
+        Thursday after their ticket's creation date
+        Returns the cutoff (UTC) for tickets whose deadline has passed:
+        midnight Tehran time of the most recent Thursday whose 8 AM has passed
+        Tickets created before it are past their deadline
+        """
+        now_tehran = timezone.now().astimezone(TEHRAN_TZ)
+        days_since_thursday = (now_tehran.weekday() - 3) % 7
+        if days_since_thursday == 0 and now_tehran.hour < 8:
+            # Thursday before 8 AM, this week's deadline hasn't passed yet
+            days_since_thursday = 7
         
-        saturday_8am = now_tehran.replace(hour=8, minute=0, second=0, microsecond=0)
-        saturday_8am = saturday_8am - timedelta(days=days_to_saturday)
-        week_start = saturday_8am.astimezone(timezone.utc)
+        thursday_midnight = now_tehran.replace(hour=0, minute=0, second=0, microsecond=0)
+        thursday_midnight = thursday_midnight - timedelta(days=days_since_thursday)
         
-        return week_start
+        return thursday_midnight.astimezone(timezone.utc)
     
     @staticmethod
     def get_current_week_tickets():
@@ -69,14 +115,44 @@ class LotteryService:
         """
         week_start = LotteryService.get_current_week_start()
         
-        # Get all won tickets from this week
+        # Get all won tickets from this week (TicketSerializer reads no
+        # user fields, so the user join is left out)
         winners = Ticket.objects.filter(
             status='won',
             created_at__gte=week_start
-        ).select_related('user').order_by('-created_at')
+        ).order_by('-created_at')
         
         return winners
     
+    @staticmethod
+    def is_current_week_drawn():
+        """
+        Whether this week's lottery has already been drawn
+        """
+        return Ticket.objects.filter(
+            status='won',
+            created_at__gte=LotteryService.get_current_week_start()
+        ).exists()
+    
+    @staticmethod
+    def get_current_week_winners_version():
+        """
+        Cheap fingerprint of current week's winners: their count and latest
+        updated_at
+        Changes on draw, cancellation, deletion and any saved edit (info
+        completion, admin), in whichever process it happens
+        """
+        version = Ticket.objects.filter(
+            status='won',
+            created_at__gte=LotteryService.get_current_week_start()
+        ).aggregate(count=Count('id'), last_updated=Max('updated_at'))
+        last_updated = version['last_updated']
+        return f"{version['count']}:{last_updated.timestamp() if last_updated else 0}"
+    
+    @staticmethod
+    def winners_cache_key(week_start, version):
+        return f'lottery_winners:{week_start.isoformat()}:{version}'
+    
     @staticmethod
     def get_user_previous_info(user):
         """
@@ -85,13 +161,8 @@ class LotteryService:
         Finds the most recent ticket that has completed information (not cancelled)
         """
         # Find the most recent completed ticket for this user
-        # Exclude cancelled tickets as they might be incomplete
-        previous_ticket = Ticket.objects.filter(
-            user=user,
-            full_name__isnull=False,
-            national_id__isnull=False
-        ).exclude(
-            Q(full_name='') | Q(national_id='') | Q(status='cancelled')
+        previous_ticket = LotteryService._completed_info_tickets().filter(
+            user=user
         ).order_by('-created_at').first()
         
         if previous_ticket:
@@ -101,46 +172,103 @@ class LotteryService:
             }
         return None
     
+    @staticmethod
+    def get_users_previous_info(user_ids):
+        """
+        Batch version of get_user_previous_info for many users in one query
+        Returns: dict of user_id -> dict with full_name, national_id
+        Users without a completed ticket are left out
+        """
+        rows = LotteryService._completed_info_tickets().filter(
+            user_id__in=user_ids
+        ).order_by('user_id', '-created_at').values_list(
+            'user_id', 'full_name', 'national_id'
+        )
+        
+        # Rows are newest first per user, keep the first one seen
+        previous_info = {}
+        for user_id, full_name, national_id in rows:
+            if user_id not in previous_info:
+                previous_info[user_id] = {
+                    'full_name': full_name,
+                    'national_id': national_id
+                }
+        return previous_info
+    
+    @staticmethod
+    def _completed_info_tickets():
+        """
+        Tickets with completed information
+        Cancelled tickets are excluded as they might be incomplete
+        """
+        return Ticket.objects.filter(
+            full_name__isnull=False,
+            national_id__isnull=False
+        ).exclude(
+            Q(full_name='') | Q(national_id='') | Q(status='cancelled')
+        )
+    
     @staticmethod
     def select_winners(count=None):
         """
         Select random winners from current week's pending tickets
         If user has previous completed information, it will be copied automatically
+        Returns list of winner tickets, already saved and with user
+        (id, phone_number) loaded; callers don't need to re-fetch them
+        Returns an empty list if this week has already been drawn
         """
         if count is None:
             count = settings.LOTTERY_WINNERS_COUNT
         
-        tickets = LotteryService.get_current_week_tickets()
-        tickets_list = list(tickets)
-        
-        if len(tickets_list) < count:
-            count = len(tickets_list)
-        
-        # Select random winners
-        winners = random.sample(tickets_list, count)
-        
-        # Update status to 'won' and copy previous info if available
-        winner_ids = [ticket.id for ticket in winners]
-        
-        # Update each winner ticket with previous info if available
-        # Also set default values: received_date = "پنجشنبه", selected_period = "ناهار"
-        for ticket in winners:
-            previous_info = LotteryService.get_user_previous_info(ticket.user)
-            update_data = {
-                'status': 'won',
-                'received_date': 'پنجشنبه',
-                'selected_period': 'ناهار'
-            }
+        with transaction.atomic():
+            # Overlapping runs (scheduler, command, admin) wait for each
+            # other here; the later ones then see this week's winners and
+            # draw nothing
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOTTERY_DRAW_LOCK_ID])
+            
+            if LotteryService.is_current_week_drawn():
+                logger.warning("Lottery already drawn for current week")
+                return []
             
-            if previous_info:
-                # Copy previous information (full_name and national_id)
-                update_data['full_name'] = previous_info['full_name']
-                update_data['national_id'] = previous_info['national_id']
+            # Select random winners in the database; only the winners are
+            # loaded (fewer if there are fewer tickets than count)
+            winners = list(
+                LotteryService.get_current_week_tickets()
+                .order_by('?')[:count]
+            )
             
-            Ticket.objects.filter(id=ticket.id).update(**update_data)
+            # Previous info for all winners in one query
+            previous_infos = LotteryService.get_users_previous_info(
+                {ticket.user_id for ticket in winners}
+            )
+            
+            # Update each winner ticket with previous info if available
+            # Also set default values: received_date = "پنجشنبه", selected_period = "ناهار"
+            for ticket in winners:
+                previous_info = previous_infos.get(ticket.user_id)
+                ticket.status = 'won'
+                ticket.received_date = 'پنجشنبه'
+                ticket.selected_period = 'ناهار'
+                
+                if previous_info:
+                    # Copy previous information (full_name and national_id)
+                    ticket.full_name = previous_info['full_name']
+                    ticket.national_id = previous_info['national_id']
+            
+            # Save all winners in one statement
+            Ticket.objects.bulk_update(
+                winners,
+                ['status', 'received_date', 'selected_period', 'full_name', 'national_id'],
+                batch_size=1000
+            )
         
-        # Refresh winners to get updated status
-        winners = Ticket.objects.filter(id__in=winner_ids)
+        # Callers only read winner.user.phone_number, load those in one query
+        prefetch_related_objects(
+            winners,
+            Prefetch('user', queryset=User.objects.only('id', 'phone_number'))
+        )
         
         return winners
     
@@ -162,10 +290,9 @@ class LotteryService:
         try:
             KavehNegarService.send_otp_sms(phone_number, ticket_number, template)
             return True
-        except Exception as e:
+        except Exception:
             # Log error but don't fail the lottery
-            if settings.DEBUG:
-                print(f"Failed to send SMS to {phone_number}: {str(e)}")
+            logger.exception("Failed to send SMS to %s", phone_number)
             return False
 
 
@@ -173,6 +300,17 @@ class KavehNegarLotteryService:
     """
     Service for sending lottery winner SMS via KavehNegar
     """
+    # KavehNegar's lookup endpoint takes a single receptor, so bulk sends
+    # are parallelized client-side
+    BULK_SMS_MAX_WORKERS = 16
+    
+    # Shared HTTP session, sized for BULK_SMS_MAX_WORKERS concurrent sends
+    _session = requests.Session()
+    _session.mount('https://', HTTPAdapter(
+        pool_connections=BULK_SMS_MAX_WORKERS,
+        pool_maxsize=BULK_SMS_MAX_WORKERS * 2,
+        max_retries=Retry(total=2, backoff_factor=0.1),
+    ))
     
     @staticmethod
     def send_winner_sms(phone_number, ticket_number, template_name=None):
@@ -197,7 +335,7 @@ class KavehNegarLotteryService:
         }
         
         try:
-            response = requests.post(url, data=data, timeout=10)
+            response = KavehNegarLotteryService._session.post(url, data=data, timeout=10)
             
             if response.status_code != 200:
                 error_msg = f"KavehNegar API returned status {response.status_code}"
@@ -221,4 +359,26 @@ class KavehNegarLotteryService:
                 
         except requests.exceptions.RequestException as e:
             raise Exception(f"Failed to send SMS via KavehNegar: {str(e)}")
-
+    
+    @staticmethod
+    def send_winner_sms_bulk(recipients, template_name=None):
+        """
+        Send winner SMS to many recipients concurrently
+        recipients: iterable of (phone_number, ticket_number)
+        Returns list of (phone_number, ticket_number, error), error is None on success
+        """
+        recipients = list(recipients)
+        if not recipients:
+            return []
+        
+        def send(recipient):
+            phone_number, ticket_number = recipient
+            try:
+                KavehNegarLotteryService.send_winner_sms(phone_number, ticket_number, template_name)
+                return phone_number, ticket_number, None
+            except Exception as e:
+                return phone_number, ticket_number, e
+        
+        max_workers = min(KavehNegarLotteryService.BULK_SMS_MAX_WORKERS, len(recipients))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(send, recipients))
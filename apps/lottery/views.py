@@ -2,15 +2,46 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from datetime import datetime, timedelta
+import hashlib
+import json
 from django.utils import timezone
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists
+
+from core.swagger import swagger_auto_schema
 
 from .models import Ticket
 from .serializers import TicketSerializer, TicketCreateSerializer, WinnerInfoSerializer
-from .services import LotteryService
+from .services import LotteryService, TEHRAN_TZ, WINNERS_CACHE_TIMEOUT
+
+User = get_user_model()
+
+
+def _registration_hours_mask():
+    """
+    Bit (weekday * 24 + hour) is set for every open registration hour
+    Weekday: 0=Monday ... 5=Saturday, 6=Sunday (Tehran time)
+    """
+    mask = 0
+    for weekday in range(7):
+        for hour in range(24):
+            is_open = (
+                (weekday == 5 and hour >= 8)  # Saturday from 8 AM
+                or weekday in (6, 0, 1)  # Sunday, Monday, Tuesday
+                or (weekday == 2 and hour < 20)  # Wednesday until 8 PM
+            )
+            if is_open:
+                mask |= 1 << (weekday * 24 + hour)
+    return mask
+
+
+REGISTRATION_HOURS_MASK = _registration_hours_mask()
 
 
 class ParticipateLotteryView(APIView):
@@ -32,39 +63,9 @@ class ParticipateLotteryView(APIView):
         Check if current time is within registration period
         Registration: Saturday 8 AM to Wednesday 8 PM (Tehran time)
         """
-        try:
-            from zoneinfo import ZoneInfo
-            tehran_tz = ZoneInfo('Asia/Tehran')
-        except ImportError:
-            # Fallback for older Python versions
-            import pytz
-            tehran_tz = pytz.timezone('Asia/Tehran')
-        
-        now_tehran = timezone.now().astimezone(tehran_tz)
-        current_weekday = now_tehran.weekday()  # 0=Monday, 6=Sunday
-        current_hour = now_tehran.hour
-        
-        # Saturday = 5, Sunday = 6
-        # Monday = 0, Tuesday = 1, Wednesday = 2
-        
-        # Check if it's Saturday (5) and after 8 AM
-        if current_weekday == 5:  # Saturday
-            return current_hour >= 8
-        
-        # Check if it's Sunday (6) - all day
-        if current_weekday == 6:  # Sunday
-            return True
-        
-        # Check if it's Monday (0) or Tuesday (1) - all day
-        if current_weekday in [0, 1]:  # Monday, Tuesday
-            return True
-        
-        # Check if it's Wednesday (2) and before 8 PM (20:00)
-        if current_weekday == 2:  # Wednesday
-            return current_hour < 20
-        
-        # Thursday (3), Friday (4) - not allowed
-        return False
+        now_tehran = timezone.now().astimezone(TEHRAN_TZ)
+        slot = now_tehran.weekday() * 24 + now_tehran.hour
+        return bool(REGISTRATION_HOURS_MASK >> slot & 1)
     
     @staticmethod
     def get_current_week_start():
@@ -72,67 +73,26 @@ class ParticipateLotteryView(APIView):
         Get the start of current registration week (Saturday 8 AM Tehran time)
         Returns datetime in UTC (timezone-aware)
         """
-        try:
-            from zoneinfo import ZoneInfo
-            tehran_tz = ZoneInfo('Asia/Tehran')
-        except ImportError:
-            import pytz
-            tehran_tz = pytz.timezone('Asia/Tehran')
-        
-        now_tehran = timezone.now().astimezone(tehran_tz)
-        current_weekday = now_tehran.weekday()  # 0=Monday, 6=Sunday
-        
-        # Calculate days to subtract to get to Saturday
-        # Saturday = 5
-        if current_weekday == 5:  # Saturday
-            if now_tehran.hour < 8:
-                # Before 8 AM, go to previous Saturday
-                days_to_saturday = 7
-            else:
-                # After 8 AM, this is the current Saturday
-                days_to_saturday = 0
-        else:
-            # Calculate days to last Saturday
-            days_to_saturday = (current_weekday - 5) % 7
-            if days_to_saturday == 0:
-                days_to_saturday = 7
-        
-        # Get Saturday 8 AM of current week
-        saturday_8am = now_tehran.replace(hour=8, minute=0, second=0, microsecond=0)
-        saturday_8am = saturday_8am - timedelta(days=days_to_saturday)
-        
-        # Convert back to UTC and return timezone-aware
-        return saturday_8am.astimezone(timezone.utc)
+        return LotteryService.get_current_week_start()
     
     @staticmethod
-    def has_participated_this_week(user):
+    def get_participation_flags(user):
         """
-        Check if user has already participated in current week
-        Current week: Saturday 8 AM to Wednesday 8 PM
+        Return (has participated this week, has won in the last 6 months)
+        with a single query, locking the user's row until the end of the
+        surrounding transaction
         """
         week_start = ParticipateLotteryView.get_current_week_start()
-        
-        has_ticket = Ticket.objects.filter(
-            user=user,
-            created_at__gte=week_start
-        ).exists()
-        
-        return has_ticket
-    
-    @staticmethod
-    def has_won_in_last_six_months(user):
-        """
-        Check if user has won in the last 6 months
-        """
         six_months_ago = timezone.now() - timedelta(days=180)
         
-        won_tickets = Ticket.objects.filter(
-            user=user,
-            status='won',
-            created_at__gte=six_months_ago
-        ).exists()
-        
-        return won_tickets
+        return User.objects.select_for_update().filter(pk=user.pk).annotate(
+            participated=Exists(
+                Ticket.objects.filter(user=user, created_at__gte=week_start)
+            ),
+            won_recently=Exists(
+                Ticket.objects.filter(user=user, status='won', created_at__gte=six_months_ago)
+            ),
+        ).values_list('participated', 'won_recently').get()
     
     @swagger_auto_schema(
         operation_description="شرکت در قرعه کشی. با ارسال این درخواست، یک بلیط جدید با شماره ژتون رندوم برای کاربر ایجاد می‌شود. زمان ثبت نام: شنبه 8 صبح تا چهارشنبه 8 عصر (به وقت تهران).",
@@ -161,38 +121,43 @@ class ParticipateLotteryView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if user has already participated this week
-        if self.has_participated_this_week(request.user):
-            return Response(
-                {
-                    'error': 'شما در این هفته قبلاً در قرعه کشی شرکت کرده‌اید. هر کاربر فقط یک بار در هفته می‌تواند شرکت کند.'
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Check if user has won in last 6 months
-        if self.has_won_in_last_six_months(request.user):
-            return Response(
-                {
-                    'error': 'شما در 6 ماه گذشته برنده قرعه کشی شده‌اید و نمی‌توانید دوباره شرکت کنید'
-                },
-                status=status.HTTP_400_BAD_REQUEST
+        user = request.user
+        
+        with transaction.atomic():
+            # Both checks in one query; locking the user row serializes
+            # concurrent participate requests from the same user
+            participated, won_recently = self.get_participation_flags(user)
+            
+            # Check if user has already participated this week
+            if participated:
+                return Response(
+                    {
+                        'error': 'شما در این هفته قبلاً در قرعه کشی شرکت کرده‌اید. هر کاربر فقط یک بار در هفته می‌تواند شرکت کند.'
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Check if user has won in last 6 months
+            if won_recently:
+                return Response(
+                    {
+                        'error': 'شما در 6 ماه گذشته برنده قرعه کشی شده‌اید و نمی‌توانید دوباره شرکت کنید'
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Create ticket for authenticated user
+            ticket = Ticket.objects.create(
+                user=user,
+                status='pending'
+                # ticket_number will be auto-generated in save() method
+                # Other fields remain null/blank
             )
         
-        # Create ticket for authenticated user
-        ticket = Ticket.objects.create(
-            user=request.user,
-            status='pending'
-            # ticket_number will be auto-generated in save() method
-            # Other fields remain null/blank
-        )
-        
-        serializer = TicketSerializer(ticket)
-        
         return Response(
             {
                 'message': 'شما با موفقیت در قرعه کشی شرکت کردید',
-                'ticket': serializer.data
+                'ticket': TicketSerializer().to_representation(ticket)
             },
             status=status.HTTP_201_CREATED
         )
@@ -231,22 +196,16 @@ class CompleteWinnerInfoView(APIView):
         Get current winner ticket with pre-filled information if available
         """
         # Check if user has a won ticket
-        try:
-            ticket = Ticket.objects.get(
-                user=request.user,
-                status='won'
-            )
-        except Ticket.DoesNotExist:
+        ticket = self.get_won_ticket(request.user)
+        if ticket is None:
             return Response(
                 {'error': 'شما برنده قرعه کشی نشده‌اید'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         # Check if ticket already has information (auto-filled from previous win)
-        ticket_serializer = TicketSerializer(ticket)
-        
         response_data = {
-            'ticket': ticket_serializer.data,
+            'ticket': TicketSerializer().to_representation(ticket),
             'has_previous_info': bool(ticket.full_name and ticket.national_id)
         }
         
@@ -280,12 +239,8 @@ class CompleteWinnerInfoView(APIView):
             )
         
         # Check if user has a won ticket
-        try:
-            ticket = Ticket.objects.get(
-                user=request.user,
-                status='won'
-            )
-        except Ticket.DoesNotExist:
+        ticket = self.get_won_ticket(request.user)
+        if ticket is None:
             return Response(
                 {'error': 'شما برنده قرعه کشی نشده‌اید'},
                 status=status.HTTP_404_NOT_FOUND
@@ -308,56 +263,34 @@ class CompleteWinnerInfoView(APIView):
         ticket.quantity = serializer.validated_data['quantity']
         ticket.save()
         
-        ticket_serializer = TicketSerializer(ticket)
-        
         return Response(
             {
                 'message': 'اطلاعات شما با موفقیت ثبت شد',
-                'ticket': ticket_serializer.data
+                'ticket': TicketSerializer().to_representation(ticket)
             },
             status=status.HTTP_200_OK
         )
     
+    @staticmethod
+    def get_won_ticket(user):
+        """
+        Get user's latest won ticket, None if there isn't one
+        Won tickets are kept, so a user who won again after six months
+        has more than one
+        """
+        return Ticket.objects.filter(
+            user=user,
+            status='won'
+        ).order_by('-created_at').first()
+    
     @staticmethod
     def is_within_deadline(ticket_created_at):
         """
         Check if current time is within deadline (Thursday 8 AM Tehran time)
         Deadline: Until Thursday 8 AM after winning (Wednesday 8 PM)
+        Same cutoff the scheduler uses to cancel incomplete winners
         """
-        try:
-            from zoneinfo import ZoneInfo
-            tehran_tz = ZoneInfo('Asia/Tehran')
-        except ImportError:
-            import pytz
-            tehran_tz = pytz.timezone('Asia/Tehran')
-        
-        now_tehran = timezone.now().astimezone(tehran_tz)
-        ticket_created_tehran = ticket_created_at.astimezone(tehran_tz)
-        
-        # Calculate the Thursday 8 AM after the ticket was created (Wednesday 8 PM)
-        # If ticket was created on Wednesday 8 PM, deadline is Thursday 8 AM (next day)
-        ticket_weekday = ticket_created_tehran.weekday()
-        ticket_hour = ticket_created_tehran.hour
-        
-        # Find the next Thursday 8 AM after ticket creation
-        if ticket_weekday == 2:  # Wednesday
-            if ticket_hour >= 20:  # After 8 PM
-                # Deadline is next day (Thursday) 8 AM
-                days_to_thursday = 1
-            else:
-                # Before 8 PM, shouldn't happen for won tickets, but handle it
-                days_to_thursday = 1
-        else:
-            # Calculate days to next Thursday
-            days_to_thursday = (3 - ticket_weekday) % 7
-            if days_to_thursday == 0:
-                days_to_thursday = 7
-        
-        deadline = ticket_created_tehran.replace(hour=8, minute=0, second=0, microsecond=0)
-        deadline = deadline + timedelta(days=days_to_thursday)
-        
-        # Check if current time is before deadline
-        return now_tehran < deadline
+        return ticket_created_at >= LotteryService.get_info_deadline_cutoff()
 
 
 class UserTicketsHistoryView(APIView):
@@ -393,17 +326,18 @@ class UserTicketsHistoryView(APIView):
         """
         Get user's lottery participation history
         """
-        # Get all tickets for the authenticated user
-        tickets = Ticket.objects.filter(
+        # Get all tickets for the authenticated user (fetched once, so the
+        # count doesn't need its own query)
+        tickets = list(Ticket.objects.filter(
             user=request.user
-        ).order_by('-created_at')
+        ).order_by('-created_at'))
         
         # Serialize tickets
         serializer = TicketSerializer(tickets, many=True)
         
         return Response(
             {
-                'count': tickets.count(),
+                'count': len(tickets),
                 'results': serializer.data
             },
             status=status.HTTP_200_OK
@@ -444,29 +378,51 @@ class CurrentWeekWinnersView(APIView):
         """
         Get current week's winners
         """
-        # Get current week winners
-        winners = LotteryService.get_current_week_winners()
-        
-        # Serialize winners
-        serializer = TicketSerializer(winners, many=True)
-        
-        # Get week start for display
         week_start = LotteryService.get_current_week_start()
-        try:
-            from zoneinfo import ZoneInfo
-            tehran_tz = ZoneInfo('Asia/Tehran')
-        except ImportError:
-            import pytz
-            tehran_tz = pytz.timezone('Asia/Tehran')
-        
-        week_start_tehran = week_start.astimezone(tehran_tz)
+        # Keyed by the winners' version (one small aggregate query), so any
+        # change made by another worker, the scheduler or the admin is seen
+        # right away without cross-process invalidation
+        cache_key = LotteryService.winners_cache_key(
+            week_start, LotteryService.get_current_week_winners_version()
+        )
         
-        return Response(
-            {
+        cached = cache.get(cache_key)
+        if cached is None:
+            # Get current week winners (fetched once, so the count doesn't
+            # need its own query)
+            winners = list(LotteryService.get_current_week_winners())
+            
+            # Serialize winners
+            serializer = TicketSerializer(winners, many=True)
+            
+            # Week start for display
+            week_start_tehran = week_start.astimezone(TEHRAN_TZ)
+            
+            data = {
                 'week_start': week_start_tehran.strftime('%Y-%m-%d %H:%M:%S %Z'),
-                'count': winners.count(),
+                'count': len(winners),
                 'winners': serializer.data
-            },
+            }
+            # ETag from the content, so info completion changes it too
+            digest = hashlib.blake2b(
+                json.dumps(data, sort_keys=True).encode(),
+                digest_size=16
+            ).hexdigest()
+            cached = (data, f'"{digest}"')
+            cache.set(cache_key, cached, WINNERS_CACHE_TIMEOUT)
+        
+        data, etag = cached
+        
+        # Clients revalidate with If-None-Match and get a 304 while
+        # winners haven't changed
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+        
+        return Response(
+            data,
+            headers={'ETag': etag, 'Cache-Control': 'private, no-cache'},
             status=status.HTTP_200_OK
         )
 
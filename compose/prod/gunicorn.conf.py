@@ -2,14 +2,22 @@ import multiprocessing
 import os
 
 bind = "0.0.0.0:8000"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# Requests mostly wait on the database and SMS provider, so each worker
+# serves several at once on threads instead of adding more processes
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
 worker_connections = 1000
 timeout = 30
+# Must stay above nginx's upstream keepalive_timeout (nginx.conf)
 keepalive = 2
-max_requests = 1000
-max_requests_jitter = 50
+# Recycle workers before copy-on-write and fragmentation grow their memory;
+# forking a preloaded app is cheap
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "500"))
+max_requests_jitter = 100
 preload_app = True
+# Worker heartbeat files on tmpfs instead of disk
+worker_tmp_dir = "/dev/shm"
 
 # Logging
 accesslog = "-"
@@ -19,3 +27,11 @@ loglevel = os.getenv("LOG_LEVEL", "info")
 # Process naming
 proc_name = "auth_service"
 
+
+def pre_fork(server, worker):
+    """
+    Close DB connections opened in the master (app is preloaded) so workers
+    don't inherit and share the same sockets
+    """
+    from django.db import connections
+    connections.close_all()
@@ -0,0 +1,32 @@
+"""
+DRF renderers
+"""
+import orjson
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    JSON renderer backed by orjson
+    Compact with unescaped unicode like DRF's JSONRenderer; UTC datetimes end
+    in 'Z' and non-str dict keys are converted, as DRF does, and types orjson
+    doesn't know (lazy strings, Decimal, ...) go through DRF's encoder
+    Unlike DRF's renderer, datetimes keep full microseconds, ints must fit
+    in 64 bits, U+2028/U+2029 are not escaped and `indent` in the Accept
+    header is ignored
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    
+    _default = JSONEncoder().default
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=self._default,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        )
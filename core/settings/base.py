@@ -68,6 +68,30 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Cache
+# Shared Redis cache when REDIS_URL is set (required in production), so OTP
+# throttle counters, cached users (jwt_user:*), cached refreshed access
+# tokens and cached lottery winners are shared by all workers; per-process
+# memory cache otherwise. The validated-token cache in
+# apps.accounts.authentication is per-process either way
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', '50')),
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -110,6 +134,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -161,6 +189,14 @@ OTP_CODE_LENGTH = int(os.getenv('OTP_CODE_LENGTH', '6'))
 OTP_EXPIRY_MINUTES = int(os.getenv('OTP_EXPIRY_MINUTES', '5'))
 OTP_RATE_LIMIT_COUNT = int(os.getenv('OTP_RATE_LIMIT_COUNT', '3'))
 OTP_RATE_LIMIT_MINUTES = int(os.getenv('OTP_RATE_LIMIT_MINUTES', '10'))
+OTP_PEPPER = os.getenv('OTP_PEPPER', SECRET_KEY)
+OTP_VERIFY_RATE_LIMIT_COUNT = int(os.getenv('OTP_VERIFY_RATE_LIMIT_COUNT', '5'))
+
+# OTP endpoints are throttled per phone number (see apps.accounts.throttles)
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {
+    'otp_request': f'{OTP_RATE_LIMIT_COUNT}/{OTP_RATE_LIMIT_MINUTES}m',
+    'otp_verify': f'{OTP_VERIFY_RATE_LIMIT_COUNT}/{OTP_RATE_LIMIT_MINUTES}m',
+}
 
 # Lottery Settings
 LOTTERY_WINNERS_COUNT = int(os.getenv('LOTTERY_WINNERS_COUNT', '8'))
@@ -172,6 +208,8 @@ APSCHEDULER_DATETIME_FORMAT = "N j, Y, f:s a"
 APSCHEDULER_RUN_NOW_TIMEOUT = 25  # Seconds
 
 # Swagger/OpenAPI Settings
+# Docs are always served in DEBUG; set SWAGGER_ENABLED=True to serve them in production
+SWAGGER_ENABLED = os.getenv('SWAGGER_ENABLED', 'False') == 'True'
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -3,11 +3,18 @@ Production settings
 """
 from .base import *
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 DEBUG = False
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',') if os.getenv('ALLOWED_HOSTS') else []
 
+# OTP throttles (the verify limit in particular) count in the cache, so
+# every worker must share it; per-process memory caches would multiply the
+# limits by the number of workers and reset them on each worker restart
+if not REDIS_URL:
+    raise ImproperlyConfigured("REDIS_URL is required in production")
+
 # Database
 DATABASES = {
     'default': dj_database_url.config(
@@ -16,6 +23,8 @@ DATABASES = {
         conn_health_checks=True,
     )
 }
+# Required behind a transaction-pooling proxy such as PgBouncer
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = os.getenv('DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True'
 
 # Security settings
 SECURE_SSL_REDIRECT = os.getenv('SECURE_SSL_REDIRECT', 'False') == 'True'
@@ -0,0 +1,34 @@
+"""
+Test settings
+"""
+from .base import *
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['*']
+
+# In-memory SQLite: no disk I/O for the test database
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# Build tables straight from the models instead of running migrations
+MIGRATION_MODULES = {
+    'accounts': None,
+    'lottery': None,
+}
+
+# Tests never talk to Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Fast hashing for any test that sets a real password
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
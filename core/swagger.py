@@ -0,0 +1,26 @@
+"""
+Swagger/OpenAPI helpers
+"""
+from django.conf import settings
+from drf_yasg.utils import swagger_auto_schema as _swagger_auto_schema
+
+
+def swagger_enabled():
+    """
+    API docs are served in DEBUG, or in production when SWAGGER_ENABLED is set
+    """
+    return settings.DEBUG or settings.SWAGGER_ENABLED
+
+
+def _noop(view_method):
+    return view_method
+
+
+def swagger_auto_schema(**kwargs):
+    """
+    drf_yasg's swagger_auto_schema, or a no-op decorator when docs are disabled
+    so no schema metadata is attached to views
+    """
+    if swagger_enabled():
+        return _swagger_auto_schema(**kwargs)
+    return _noop